@@ -19,7 +19,7 @@ from __future__ import division
 from __future__ import print_function
 
 import logging
-import readline
+import os
 import sys
 from absl import app
 from absl import flags
@@ -29,12 +29,14 @@ FLAGS = flags.FLAGS
 
 
 def main(_):
+  # Inventory library is bound by tcli_lib at import.
+  inventory = tcli.inventory
   tcli_singleton = tcli.TCLI()
   try:
     logging.debug('Executing StartUp.')
     tcli_singleton.StartUp(FLAGS.cmds, FLAGS.interactive)
   except (EOFError, tcli.TcliCmdError,
-          tcli.inventory.AuthError, tcli.inventory.InventoryError,
+          inventory.AuthError, inventory.InventoryError,
           ValueError) as error_message:
     print('%s' % error_message, file=sys.stderr)
     del tcli_singleton
@@ -42,9 +44,16 @@ def main(_):
 
   if not tcli_singleton.interactive:
     del tcli_singleton
-    sys.exit(0)
+    # Skip interpreter teardown for short lived batch runs.
+    # Output is flushed explicitly as os._exit bypasses the exit handlers.
+    logging.shutdown()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(0)  # pylint: disable=protected-access
 
   # Interactive prompt, setup Tab completion
+  # Readline is only needed interactively, so is not imported in batch mode.
+  import readline  # pylint: disable=g-import-not-at-top
   readline.set_completer(tcli_singleton.Completer)
   readline.parse_and_bind('tab: complete')
   readline.parse_and_bind('?: complete')
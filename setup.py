@@ -18,9 +18,19 @@
 
 # To use a consistent encoding
 from codecs import open  # pylint: disable=redefined-builtin,g-importing-member
+import os
 from os import path
 from setuptools import setup
 
+try:
+  from Cython.Build import cythonize  # pylint: disable=g-import-not-at-top
+except ImportError:
+  cythonize = None
+try:
+  from mypyc.build import mypycify  # pylint: disable=g-import-not-at-top
+except ImportError:
+  mypycify = None
+
 __version__ = '1.0.0'
 here = path.abspath(path.dirname(__file__))
 
@@ -28,6 +38,21 @@ here = path.abspath(path.dirname(__file__))
 with open(path.join(here, 'README.md'), encoding='utf8') as f:
   long_description = f.read()
 
+# Optionally compile the command parser, it is called for every command line.
+# The pure Python module remains in the package and is used when the extension
+# is not built. Enable with TCLI_CYTHON=1 when Cython is installed, or with
+# TCLI_MYPYC=1 when mypyc is installed.
+ext_modules = []
+if os.environ.get('TCLI_CYTHON') == '1':
+  if not cythonize:
+    raise SystemExit('TCLI_CYTHON=1 requires Cython: pip install cython')
+  ext_modules = cythonize(['tcli/command_parser.py'],
+                          compiler_directives={'language_level': 3})
+elif os.environ.get('TCLI_MYPYC') == '1':
+  if not mypycify:
+    raise SystemExit('TCLI_MYPYC=1 requires mypyc: pip install mypy')
+  ext_modules = mypycify(['tcli/command_parser.py'])
+
 setup(
     name='tcli',
     maintainer='Google',
@@ -48,6 +73,7 @@ setup(
         'Programming Language :: Python :: 3'],
     requires=['absl', 'mock', 'textfsm', 'tqdm'],
     packages=['tcli'],
+    ext_modules=ext_modules,
     include_package_data=True,
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
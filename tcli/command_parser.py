@@ -15,11 +15,22 @@
 """Parses TCLI command string and calls handler methods."""
 
 
+import functools
 import re
 import shlex
 
 # Command suffix for denoting appending values.
 APPEND = '+'
+# Matches characters not permitted in non regexp arguments.
+NON_WORD_RE = re.compile(r'\W')
+# Arguments separated by the whitespace characters recognised by shlex.
+SHLEX_ARG_RE = re.compile(r'[^ \t\r\n]+')
+
+
+@functools.lru_cache(maxsize=None)
+def _FormatHelp(help_str):
+  """Returns help string with the APPEND suffix substituted."""
+  return help_str.format(APPEND=APPEND)
 
 
 class Error(Exception):
@@ -30,47 +41,63 @@ class ParseError(Error):
   """General command parse error."""
 
 
-class CommandParser(dict):
-  """Class handles the setup of commandline functions and runtime parsing."""
-
-  class _Command(object):
-    """Holds attributes of a command."""
-
-    def __init__(self, command_attr):
-      self.attr = command_attr
+class _Command(object):
+  """Holds attributes of a command."""
 
-    # Expose the dictionary as read-only attributes of the object.
+  __slots__ = ('append', 'completer', 'default_value', 'handler', 'help_str',
+               'inline', 'max_args', 'min_args', 'raw_arg', 'regexp',
+               'short_name', 'toggle')
 
+  def __init__(self, help_str, short_name, min_args, max_args, default_value,
+               append, inline, raw_arg, regexp, toggle, handler, completer):
     # Command can set a value by either apend or replace.
-    append = property(lambda self: self.attr['append'])
+    self.append = append
     # Interactive command completion.
-    completer = property(lambda self: self.attr['completer'])
+    self.completer = completer
     # At start value, typically derived form flags.
-    default_value = property(lambda self: self.attr['default_value'])
+    self.default_value = default_value
     # Method to call when command executed.
-    handler = property(lambda self: self.attr['handler'])
+    self.handler = handler
     # Text explaining how to use the command.
-    help_str = property(lambda self: self.attr['help_str'])
+    self.help_str = help_str
     # Can be supplied on the rhs as a inline command modifier.
-    inline = property(lambda self: self.attr['inline'])
+    self.inline = inline
     # Maximum and minimum number of args permitted.
-    max_args = property(lambda self: self.attr['max_args'])
-    min_args = property(lambda self: self.attr['min_args'])
+    self.max_args = max_args
+    self.min_args = min_args
     # Only one unparsed arg i.e. may contain unquoted white space etc.
-    raw_arg = property(lambda self: self.attr['raw_arg'])
+    self.raw_arg = raw_arg
     # Command args may have non-alphanums.
-    regexp = property(lambda self: self.attr['regexp'])
+    self.regexp = regexp
     # Single letter short name for command.
-    short_name = property(lambda self: self.attr['short_name'])
+    self.short_name = short_name
     # The command expects a bool and flips the value if unspecified.
-    toggle = property(lambda self: self.attr['toggle'])
+    self.toggle = toggle
+
+
+class CommandParser(object):
+  """Class handles the setup of commandline functions and runtime parsing."""
+
+  def __init__(self):
+    # Command objects indexed by command name.
+    self._commands = {}
+    # Sorted command names, rebuilt when commands are (un)registered.
+    self._command_names = None
+    # Full command name indexed by short name.
+    self._short_index = {}
+
+  def __contains__(self, command_name):
+    return command_name in self._commands
+
+  def __iter__(self):
+    return iter(self._commands)
+
+  def __len__(self):
+    return len(self._commands)
 
   def _ShortCommand(self, short_name):
     """Find full command name for a short command letter."""
-
-    for command_name in self:
-      if self[command_name].short_name == short_name:
-        return command_name
+    return self._short_index.get(short_name)
 
   def _CommandExpand(self, line):
     """Strips off command name and append indicator.
@@ -88,27 +115,27 @@ class CommandParser(dict):
 
     # Short commands are non-alphabetic or capitalised,
     # long names are always lowercase.
+    # An empty line yields an empty probe, which is never a short name.
     append = False
-    command_name = None
-    if line:
-      command_name = self._ShortCommand(line[0])
-      if command_name:
-        line = line[1:]
-        # Short commands optionally have the APPEND suffix.
-        if line and line[0] == APPEND:
-          append = True
-          line = line[1:]
-        line = line.lstrip(' ')
+    command_name = self._ShortCommand(line[:1])
+    if command_name:
+      line = line[1:]
+      # Short commands optionally have the APPEND suffix.
+      if line.startswith(APPEND):
+        append = True
+        line = line[len(APPEND):]
+      line = line.lstrip(' ')
     return (command_name, line, append)
 
   def ExecHandler(self, command_name, args, append):
     """Execute the handler associated with this command."""
 
-    if not self[command_name].handler:
+    handler = self._commands[command_name].handler
+    if not handler:
       raise ParseError('Unable to exec handler, "%s" has no handler.' %
                        command_name)
 
-    return self[command_name].handler.__call__(command_name, args, append)
+    return handler(command_name, args, append)
 
   def ExecWithDefault(self, command_name):
     """Executes command handler with the default provided as the argument.
@@ -124,20 +151,21 @@ class CommandParser(dict):
       ParseError: if command doesn't accept an argument, default or otherwise.
     """
 
-    if command_name not in self:
+    command = self._commands.get(command_name)
+    if command is None:
       raise ValueError
 
-    if not hasattr(self[command_name], 'default_value'):
+    if not hasattr(command, 'default_value'):
       return
 
-    value = self[command_name].default_value
-    if self[command_name].toggle:
+    value = command.default_value
+    if command.toggle:
       if value:
         value = 'on'
       else:
         value = 'off'
     # Confirm that command expects an argument.
-    if not self[command_name].max_args:
+    if not command.max_args:
       raise ParseError('Unable to set default, "%s" expects no arguments.' %
                        command_name)
 
@@ -145,7 +173,21 @@ class CommandParser(dict):
 
   def GetCommand(self, command_name):
     """Returns object for a command, None otherwise."""
-    return self.get(command_name)
+    return self._commands.get(command_name)
+
+  def GetCommandName(self, command_name):
+    """Returns full name for a command or short name, None otherwise."""
+
+    if command_name in self._commands:
+      return command_name
+    return self._ShortCommand(command_name)
+
+  def GetCommandNames(self):
+    """Returns sorted tuple of command names."""
+
+    if self._command_names is None:
+      self._command_names = tuple(sorted(self._commands))
+    return self._command_names
 
   def GetDefault(self, command_name):
     """Returns default value for a command.
@@ -158,13 +200,13 @@ class CommandParser(dict):
     Returns:
       Default value for the command.
     """
-    return self[command_name].default_value
+    return self._commands[command_name].default_value
 
   def InlineOnly(self):
     """Unregister all non-inline commands from parser."""
 
-    for command_name in [c for c in self.keys()]:
-      if not self[command_name].inline:
+    for (command_name, command) in list(self._commands.items()):
+      if not command.inline:
         self.UnRegisterCommand(command_name)
 
   def ParseCommandLine(self, line):
@@ -190,48 +232,47 @@ class CommandParser(dict):
     # Not short name, so extract long one.
     if not command_name:
       # Separate command from subsequent arguments.
-      if ' ' in line:
-        command_end = line.index(' ')
-        command_name = line[:command_end]
-        line = line[command_end:]
-      else:
-        command_name = line
-        line = ''
+      (command_name, _, line) = line.partition(' ')
       # Remove trailing whitespace.
       line = line.strip()
       if command_name.endswith(APPEND):
         command_name = command_name[:-1]
         append = True
 
-    if command_name not in self:
+    command = self._commands.get(command_name)
+    if command is None:
       raise ParseError('Invalid escape command %s.' % repr(command_name))
 
     # Raw args receive no further parsing.
-    if self[command_name].raw_arg:
+    if command.raw_arg:
       return (command_name, [line], append)
 
-    if append and not self[command_name].append:
+    if append and not command.append:
       raise ParseError(
           'Command "%s" does not support append mode.' % command_name)
 
     # Split remaining line into arguments.
     # Silently discard additional arguments.
-    try:
-      arguments = shlex.split(line)
-    except ValueError as error_message:
-      raise ParseError('Invalid string could not be parsed into arguments: %s' %
-                       error_message)
-
-    if (len(arguments) < self[command_name].min_args or
-        len(arguments) > self[command_name].max_args):
-      raise ParseError('Invalid number of arguments, found "%s".' %
-                       len(arguments))
+    if '"' not in line and "'" not in line and '\\' not in line:
+      # Without quotes or escapes, shlex splits on whitespace alone.
+      # Note shlex whitespace is narrower than that of str.split.
+      arguments = SHLEX_ARG_RE.findall(line)
+    else:
+      try:
+        arguments = shlex.split(line)
+      except ValueError as error_message:
+        raise ParseError(
+            'Invalid string could not be parsed into arguments: %s' %
+            error_message)
+
+    arg_count = len(arguments)
+    if arg_count < command.min_args or arg_count > command.max_args:
+      raise ParseError('Invalid number of arguments, found "%s".' % arg_count)
 
     # Check if a command only expects (Alpha numeric) arguments.
-    if (not self[command_name].regexp and
-        not self[command_name].raw_arg):
+    if not command.regexp:
       for arg in arguments:
-        if re.search(r'\W', arg):
+        if NON_WORD_RE.search(arg):
           raise ParseError('Arguments with alphanumeric characters only.')
 
     return (command_name, arguments, append)
@@ -258,20 +299,22 @@ class CommandParser(dict):
       completer: method, returns list of valid completions for commandline.
     """
 
-    self[command_name] = self._Command({
-        'help_str': help_str.format(APPEND=APPEND),
-        'short_name': short_name,
-        'min_args': min_args,
-        'max_args': max_args,
-        'default_value': default_value,
-        'append': append,
-        'inline': inline,
-        'raw_arg': raw_arg,
-        'regexp': regexp,
-        'toggle': toggle,
-        'handler': handler,
-        'completer': completer
-    })
+    self.UnRegisterCommand(command_name)
+    if short_name:
+      self._short_index[short_name] = command_name
+    self._commands[command_name] = _Command(
+        help_str=_FormatHelp(help_str),
+        short_name=short_name,
+        min_args=min_args,
+        max_args=max_args,
+        default_value=default_value,
+        append=append,
+        inline=inline,
+        raw_arg=raw_arg,
+        regexp=regexp,
+        toggle=toggle,
+        handler=handler,
+        completer=completer)
 
   def UnRegisterCommand(self, command_name):
     """Remove support from command.
@@ -281,5 +324,9 @@ class CommandParser(dict):
     Args:
       command_name: str, command.
     """
-    if command_name in self:
-      del self[command_name]
+    if command_name in self._commands:
+      short_name = self._commands[command_name].short_name
+      if self._short_index.get(short_name) == command_name:
+        del self._short_index[short_name]
+      del self._commands[command_name]
+    self._command_names = None
@@ -14,6 +14,7 @@
 
 """Tests for tcli.command_parser."""
 
+import operator
 from absl.testing import absltest as unittest
 from tcli import command_parser
 
@@ -41,6 +42,29 @@ class CommandParserTest(unittest.TestCase):
     self.assertEqual((None, '', False),
                      self.cmd_parser._CommandExpand(''))
 
+  def testGetCommandName(self):
+    """Tests resolving short names to full command names."""
+
+    self.cmd_parser.RegisterCommand('boo', '', short_name='B')
+    self.cmd_parser.RegisterCommand('hoo', '')
+    self.assertEqual('boo', self.cmd_parser.GetCommandName('boo'))
+    self.assertEqual('boo', self.cmd_parser.GetCommandName('B'))
+    self.assertEqual('hoo', self.cmd_parser.GetCommandName('hoo'))
+    self.assertIsNone(self.cmd_parser.GetCommandName('H'))
+    self.cmd_parser.UnRegisterCommand('boo')
+    self.assertIsNone(self.cmd_parser.GetCommandName('B'))
+
+  def testGetCommandNames(self):
+    """Tests sorted command names track registration."""
+
+    self.cmd_parser.RegisterCommand('b', '')
+    self.cmd_parser.RegisterCommand('a', '')
+    self.assertEqual(('a', 'b'), self.cmd_parser.GetCommandNames())
+    self.cmd_parser.RegisterCommand('c', '')
+    self.assertEqual(('a', 'b', 'c'), self.cmd_parser.GetCommandNames())
+    self.cmd_parser.UnRegisterCommand('a')
+    self.assertEqual(('b', 'c'), self.cmd_parser.GetCommandNames())
+
   def testGetDefault(self):
     """Tests retrieving default values."""
 
@@ -156,31 +180,42 @@ class CommandParserTest(unittest.TestCase):
         ('boo', ['^.*$ .?'], False),
         self.cmd_parser.ParseCommandLine('B^.*$ .?'))
 
+  def testParseCommandLineWhitespace(self):
+    """Test arguments are split on shlex whitespace only."""
+
+    self.cmd_parser.RegisterCommand(
+        'boo', 'A help string.', short_name='B', max_args=2, regexp=True)
+
+    self.assertEqual(
+        ('boo', ['hello', 'world'], False),
+        self.cmd_parser.ParseCommandLine('boo hello\t world'))
+    # Non-breaking space is part of the argument, as it is for shlex.
+    self.assertEqual(
+        ('boo', ['ahooX\xa0'], False),
+        self.cmd_parser.ParseCommandLine('BahooX\xa0\n'))
+    # Which is then rejected by commands expecting alphanumeric arguments.
+    self.cmd_parser.RegisterCommand('hoo', 'A help string.', short_name='H')
+    self.assertRaises(command_parser.ParseError,
+                      self.cmd_parser.ParseCommandLine, 'H\xa0H')
+
   def testRegisterCommand(self):
 
+    get_attrs = operator.attrgetter(
+        'min_args', 'max_args', 'default_value', 'append',
+        'inline', 'raw_arg', 'regexp', 'toggle')
+
     # Lots of defaults.
     self.cmd_parser.RegisterCommand('boo', 'A help string.', short_name='B')
-    boo = self.cmd_parser.GetCommand('boo')
-    boo_dict = {
-        'min_args': 0, 'max_args': 1, 'default_value': None, 'append': False,
-        'inline': False, 'raw_arg': False, 'regexp': False, 'toggle': False,
-        'handler': None}
+    self.assertEqual((0, 1, None, False, False, False, False, False),
+                     get_attrs(self.cmd_parser.GetCommand('boo')))
 
     # Lots on non-default
     self.cmd_parser.RegisterCommand(
         'hoo', 'A help string.', short_name='H', min_args=1,
         max_args=2, default_value=10, append=True,
         inline=True, raw_arg=True, regexp=True, toggle=True)
-    hoo = self.cmd_parser.GetCommand('hoo')
-    hoo_dict = {
-        'min_args': 1, 'max_args': 2, 'default_value': 10, 'append': True,
-        'inline': True, 'raw_arg': True, 'regexp': True, 'toggle': True,
-        'handler': None}
-
-    for attr in ('min_args', 'max_args', 'default_value', 'append',
-                 'inline', 'raw_arg', 'regexp', 'toggle'):
-      self.assertEqual(boo_dict[attr], getattr(boo, attr))
-      self.assertEqual(hoo_dict[attr], getattr(hoo, attr))
+    self.assertEqual((1, 2, 10, True, True, True, True, True),
+                     get_attrs(self.cmd_parser.GetCommand('hoo')))
 
 
 if __name__ == '__main__':
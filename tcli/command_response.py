@@ -54,21 +54,15 @@ class CmdResponse(object):
     done: (obj) Event object, true when GetRow reads beyond end of rows.
   """
 
-  # Class will only few (one) instance, so class-wide locking is acceptable.
-  _lock = threading.Lock()    # Lock access to data to support async calls.
+  __slots__ = ('_current_row', '_lock', '_pipe', '_progressbar',
+               '_response_count', '_results', '_row_index', '_row_response',
+               '_stale_count', '_uid_index', 'done')
 
-  def Synchronized(func):  # pylint: disable=no-self-argument
-    """Synchronization decorator."""
-
-    def Wrapper(main_obj, *args, **kwargs):
-      with main_obj._lock:          # pylint: disable=protected-access
-        return func(main_obj, *args, **kwargs)  # pylint: disable=not-callable
-    return Wrapper
-
-  @Synchronized
   def __init__(self):
     """Init starting values."""
 
+    # Lock access to data to support async calls.
+    self._lock = threading.Lock()
     self._pipe = {}             # Client side pipe function. Indexed on row id.
     self._results = {}          # All response objects indexed by uid.
     self._row_index = {}        # List of uid indexed by row.
@@ -76,11 +70,11 @@ class CmdResponse(object):
     self._uid_index = {}        # Which row a uid response corresponds to.
     self._current_row = 0       # Current row index of requests being returned.
     self._response_count = 0    # Total count of received responses.
+    self._stale_count = 0       # Count of discarded unexpected responses.
     self.done = threading.Event()
     # Graphic to indicate progress receiving responses.
     self._progressbar = None
 
-  @Synchronized
   def SetCommandRow(self, command_row, pipe):
     """Initialise data for a new row, each row corresponds to a command.
 
@@ -90,11 +84,11 @@ class CmdResponse(object):
             The pipe is not sent to the target so we track it here.
     """
 
-    self._row_index[command_row] = []
-    self._row_response[command_row] = []
-    self._pipe[command_row] = pipe
+    with self._lock:
+      self._row_index[command_row] = []
+      self._row_response[command_row] = []
+      self._pipe[command_row] = pipe
 
-  @Synchronized
   def SetRequest(self, command_row, request_uid):
     """Maps uid returned by inventory class to a row number and result.
 
@@ -103,11 +97,11 @@ class CmdResponse(object):
       request_uid: int, the corresponding UID provided by the inventory.
     """
 
-    self._results[request_uid] = ''
-    self._uid_index[request_uid] = command_row
-    self._row_index[command_row].append(request_uid)
+    with self._lock:
+      self._results[request_uid] = ''
+      self._uid_index[request_uid] = command_row
+      self._row_index[command_row].append(request_uid)
 
-  @Synchronized
   def AddResponse(self, response):
     """Add response to results table.
 
@@ -120,27 +114,36 @@ class CmdResponse(object):
       False if the uid is unknown, does not correspond to one of our requests.
     """
 
+    # Uids are never removed from the index and dictionary membership tests
+    # are atomic, so unexpected responses are discarded without the lock.
     if response.uid not in self._uid_index:
       # Response with an unexpected uid. This can be the case if outstanding
-      # requests are interrupted - Silently discard.
-      logging.warning("Discarded response: '%s', not expected (stale?)",
-                      response.uid)
+      # requests are interrupted - Discard. These can arrive in bulk so only
+      # the first is warned about and the rest are counted. The count is only
+      # reported, so is updated without the lock.
+      self._stale_count += 1
+      if self._stale_count == 1:
+        logging.warning("Discarded response: '%s', not expected (stale?)",
+                        response.uid)
       return False
 
-    # Add to the response object to results table.
-    self._results[response.uid] = response
-    # Find the row number from the uid in the response.
-    command_row = self._uid_index[response.uid]
-    # Add the uid to corresponding row.
-    self._row_response[command_row].append(response.uid)
-    # Track total number of responses received.
-    self._response_count += 1
-    # Visually indicate progress.
-    if self._progressbar is not None:
-      self._progressbar.update()
+    with self._lock:
+      # Add to the response object to results table.
+      self._results[response.uid] = response
+      # Find the row number from the uid in the response.
+      command_row = self._uid_index[response.uid]
+      # Add the uid to corresponding row.
+      self._row_response[command_row].append(response.uid)
+      # Track total number of responses received.
+      self._response_count += 1
+      progressbar = self._progressbar
+
+    # Visually indicate progress. The indicator does its own locking and
+    # rate limits redraws, so is updated without holding our lock.
+    if progressbar is not None:
+      progressbar.update()
     return True
 
-  @Synchronized
   def GetRow(self):
     """Return current row if fully populated with results.
 
@@ -150,33 +153,49 @@ class CmdResponse(object):
       None: if the current row is not ready.
     """
 
-    if self._current_row not in self._row_response:
-      # Reading off the end of the rows, either we've just started a new row
-      # or we are off the bottom of the table and no more rows are needed.
-      logging.debug('GetRow: Current row not in responses.')
-      # Triggers the done flag if we already have all responses.
-      if len(self._results) == self._response_count:
-        logging.debug('GetRow: All results returned.')
-        self.done.set()
-      # Otherwise we are still waiting for our first responses for this row.
+    # Most calls find the current row incomplete. List lengths are read
+    # atomically, so this is checked without the lock. The callback that adds
+    # the final response for a row calls GetRow afterwards to return it.
+    current_row = self._current_row
+    row_response = self._row_response.get(current_row)
+    if (row_response is not None and
+        len(row_response) < len(self._row_index[current_row])):
+      logging.debug('Current row incomplete.')
       return
 
-    # Have we received all responses for the current row.
-    if (len(self._row_response[self._current_row]) ==
-        len(self._row_index[self._current_row])):
-      logging.info('Row %s was complete (size %s) and returned.',
-                   self._current_row,
-                   len(self._row_response[self._current_row]))
-      # Assemble the results for the row and any corresponding pipe content.
-      result = (self._row_response[self._current_row],
-                self._pipe[self._current_row])
-      # Advance the current row.
-      self._current_row += 1
-      # Reset the progress indicator as there is results to display.
-      if self._progressbar is not None:
-        self._progressbar.close()
-      return result
-    logging.debug('Current row incomplete.')
+    with self._lock:
+      if self._current_row not in self._row_response:
+        # Reading off the end of the rows, either we've just started a new row
+        # or we are off the bottom of the table and no more rows are needed.
+        logging.debug('GetRow: Current row not in responses.')
+        # Triggers the done flag if we already have all responses.
+        if len(self._results) == self._response_count:
+          logging.debug('GetRow: All results returned.')
+          if self._stale_count > 1:
+            logging.warning('Discarded %d further unexpected responses.',
+                            self._stale_count - 1)
+            # Further calls only report responses discarded since.
+            self._stale_count = 1
+          self.done.set()
+        # Otherwise we are still waiting for our first responses for this row.
+        return
+
+      # Have we received all responses for the current row.
+      if (len(self._row_response[self._current_row]) ==
+          len(self._row_index[self._current_row])):
+        logging.info('Row %s was complete (size %s) and returned.',
+                     self._current_row,
+                     len(self._row_response[self._current_row]))
+        # Assemble the results for the row and any corresponding pipe content.
+        result = (self._row_response[self._current_row],
+                  self._pipe[self._current_row])
+        # Advance the current row.
+        self._current_row += 1
+        # Reset the progress indicator as there is results to display.
+        if self._progressbar is not None:
+          self._progressbar.close()
+        return result
+      logging.debug('Current row incomplete.')
 
   def GetResponse(self, uid):
     """Returns response object for a given uid."""
@@ -191,4 +210,4 @@ class CmdResponse(object):
     """Starts a progress indicator to indicate receiving of requests."""
 
     # TODO(harro): Display textmessage at outset, or remove.
-    self._progressbar = tqdm.tqdm(list(range(len(self._results))), desc=message)
+    self._progressbar = tqdm.tqdm(total=len(self._results), desc=message)
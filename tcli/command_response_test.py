@@ -140,6 +140,28 @@ class UnitTestCmdResponse(unittest.TestCase):
     # pylint: disable=g-generic-assert
     self.assertEqual(2, len(self.cmd_response._row_index))
 
+  def testAddResponseStale(self):
+    """Tests only the first unexpected response is warned about."""
+
+    class FakeResponse(object):
+
+      def __init__(self, uid):
+        self.uid = uid
+
+    with mock.patch.object(command_response.logging, 'warning') as mock_warn:
+      self.assertFalse(self.cmd_response.AddResponse(FakeResponse('bogus_1')))
+      self.assertFalse(self.cmd_response.AddResponse(FakeResponse('bogus_2')))
+      self.assertFalse(self.cmd_response.AddResponse(FakeResponse('bogus_3')))
+      self.assertEqual(1, mock_warn.call_count)
+      self.assertEqual(3, self.cmd_response._stale_count)
+      # The rest are counted and reported once when all rows are returned.
+      self.assertFalse(self.cmd_response.GetRow())
+      self.assertEqual(2, mock_warn.call_count)
+      mock_warn.assert_called_with(
+          'Discarded %d further unexpected responses.', 2)
+      self.assertFalse(self.cmd_response.GetRow())
+      self.assertEqual(2, mock_warn.call_count)
+
   def testGetRow(self):
     """Tests GetRow method."""
 
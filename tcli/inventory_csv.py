@@ -38,6 +38,7 @@ from __future__ import division
 from __future__ import print_function
 
 import collections
+import functools
 import os
 from absl import flags
 from absl import logging
@@ -77,6 +78,8 @@ DEFAULT_CSV_FILE = os.path.join(os.path.dirname(__file__),
 ## Where we store the canned responses.
 DEFAULT_RESPONSE_DIRECTORY = os.path.join(
     os.path.dirname(__file__), 'testdata', 'device_output')
+# Canned response file names have the spaces in commands replaced.
+CANNED_FILE_TRANSLATION = str.maketrans(' ', '_')
 
 ## CHANGEME
 ## Any devices to exclude by default for all users, should be defined here.
@@ -95,6 +98,17 @@ flags.DEFINE_string('separator', ', ',
                     'String sequence that separates entries in the CSV file.')
 
 
+@functools.lru_cache(maxsize=1024)
+def _ReadCannedFile(file_path):
+  """Returns content of a canned response file."""
+
+  # Canned responses do not change during a run so each file is read once.
+  # Failures raise IOError, which is not cached, so missing files are retried.
+  # Read as bytes and decode the whole buffer in a single pass.
+  with open(file_path, 'rb') as fp:
+    return fp.read().decode('utf-8', errors='replace')
+
+
 class Inventory(inventory_base.Inventory):
   """CSV Inventory Class.
 
@@ -223,41 +237,47 @@ class Inventory(inventory_base.Inventory):
     # No-Op as response if already formatted correctly by _SendRequests.
     return response
 
+  def _ReadCannedResult(self, request):
+    """Reads canned response for a request from file."""
+
+    # Command response message format:
+    # {
+    #   'uid' : Unique identifier for command
+    #   'device_name': Device name string
+    #   'device': Corresponding entry for the device in the device inventory.
+    #   'command': Command string issued to device
+    #   'error': Optional error message string
+    #   'data': Command response string, null if error string populated.
+    # }
+
+    # Rather than canned responses, users should make use of a device accessor
+    # library such as:
+
+    error = ''
+    file_name = '%s_%s' % (
+        request.target, request.command.translate(CANNED_FILE_TRANSLATION))
+    try:
+      data = _ReadCannedFile(
+          os.path.join(DEFAULT_RESPONSE_DIRECTORY, file_name))
+    except IOError:
+      data = ''
+      error = ('Failure to retrieve response from device "%s",'
+               ' for command "%s".' % (request.target, request.command))
+    return inventory_base.CmdResponse(uid=request.uid,
+                                      device_name=request.target,
+                                      command=request.command,
+                                      data=data,
+                                      error=error)
+
   def _SendRequests(self, requests_callbacks, deadline=None):
     """Submit command requests to device connection service."""
 
     for (request, callback) in requests_callbacks:
       # Routine supports sending commands as non blocking async calls.
       # Effective in cases where device access is controlled by a service.
-      # Here we simply open a file with canned responses and return them
+      # Here we simply read a file with canned responses and return them
       # iteratively.
-      # Command response message format:
-      # {
-      #   'uid' : Unique identifier for command
-      #   'device_name': Device name string
-      #   'device': Corresponding entry for the device in the device inventory.
-      #   'command': Command string issued to device
-      #   'error': Optional error message string
-      #   'data': Command response string, null if error string populated.
-      # }
-
-      # Rather than canned responses, users should make use of a device accessor
-      # library such as:
-
-      data, error = '', ''
-      file_name = request.target + '_' + request.command.replace(' ', '_')
-      file_path = os.path.join(DEFAULT_RESPONSE_DIRECTORY, file_name)
-      try:
-        with open(file_path) as fp:
-          data = fp.read()
-      except IOError:
-        error = ('Failure to retrieve response from device "%s",'
-                 ' for command "%s".' % (request.target, request.command))
-      response = inventory_base.CmdResponse(uid=request.uid,
-                                            device_name=request.target,
-                                            command=request.command,
-                                            data=data,
-                                            error=error)
+      response = self._ReadCannedResult(request)
       # Normally the commands would be submitted to a device server and the
       # responses returned in callbacks. For canned responses we built the
       # response and call the callback straight away.
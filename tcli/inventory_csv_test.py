@@ -186,6 +186,43 @@ class UnitTestCSVInventory(unittest.TestCase):
     self.assertEqual('xyz', request.target)
     self.assertEqual('shell', request.mode)
 
+  def testReadCannedResult(self):
+    """Test canned responses are read once and errors reported."""
+
+    inventory._ReadCannedFile.cache_clear()
+    request = self.inv._CreateCmdRequest('device_a', 'cat a', 'cli')
+    response = self.inv._ReadCannedResult(request)
+    self.assertEqual(request.uid, response.uid)
+    self.assertEqual('device_a', response.device_name)
+    self.assertTrue(response.data)
+    self.assertFalse(response.error)
+    # Repeated requests are served from the cache.
+    self.assertEqual(response.data,
+                     self.inv._ReadCannedResult(request).data)
+    self.assertEqual(1, inventory._ReadCannedFile.cache_info().hits)
+
+    request = self.inv._CreateCmdRequest('device_a', 'bogus', 'cli')
+    response = self.inv._ReadCannedResult(request)
+    self.assertFalse(response.data)
+    self.assertTrue(response.error)
+
+  def testReadCannedResultRetry(self):
+    """Test canned files that could not be read are read again."""
+
+    inventory._ReadCannedFile.cache_clear()
+    response_dir = self.create_tempdir()
+    request = self.inv._CreateCmdRequest('device_a', 'show vers', 'cli')
+    with mock.patch.object(
+        inventory, 'DEFAULT_RESPONSE_DIRECTORY', response_dir.full_path):
+      response = self.inv._ReadCannedResult(request)
+      self.assertFalse(response.data)
+      self.assertTrue(response.error)
+      # Failure is not cached, the file is read once it exists.
+      response_dir.create_file('device_a_show_vers', content='Version 1')
+      response = self.inv._ReadCannedResult(request)
+      self.assertEqual('Version 1', response.data)
+      self.assertFalse(response.error)
+
   def testCmdHandlers(self):
     """Tests the extended handler support of TCLI."""
 
@@ -46,10 +46,11 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import bisect
 import copy
 import os
 import re
-import readline
+import signal
 import subprocess
 import sys
 import tempfile
@@ -81,6 +82,8 @@ MODE_FORMATS = ['cli', 'gated', 'http', 'shell']
 # known as tilde for historic reasons.
 TILDE = '/'
 __doc__ = __doc__.replace('%s', TILDE)    # pylint: disable=redefined-builtin
+# Inline commands follow a space and a double tilde.
+INLINE_SEPARATOR = ' ' + TILDE * 2
 
 # Banner message to display at program start.
 MOTD = '#!' + '#' * 76 + '!#' + """
@@ -177,12 +180,20 @@ TILDE_COMMAND_HELP = {
     'vi': '\n    Opens buffer in vi editor.',
 }
 
+# Completer syntax in filter index commands.
+COMPLETER_SYNTAX_RE = re.compile(r'\(|\)\?')
+# Splits a command into quoted text, runs of pipes and other text.
+COMMAND_ELEMENT_RE = re.compile(
+    r"""(?P<quoted>"[^"]*"|'[^']*')|(?P<pipes>\|+)|(?P<text>[^|"']+)""")
+
 # Prompt displays the target string, count of targets and if safe mode is on.
 PROMPT_HDR = '#! <%s[%s]%s> !#'
 PROMPT_STR = '#! '
 
 # Colour values.
 COLOR_SCHEMES = ['light', 'dark', 'gross']
+# Completions for commands that toggle a value.
+TOGGLE_VALUES = ['on', 'off']
 
 LIGHT_SYSTEM_COLOR = ['yellow']
 LIGHT_WARNING_COLOR = ['red']
@@ -338,6 +349,13 @@ class TCLI(object):
     # Async callback.
     self._lock = threading.Lock()
     self._completer_list = []
+    # Token trie of the filter index, and the filter engine it was built from.
+    self._completer_trie = {}
+    self._completer_trie_engine = None
+    # Completions for a blank line, the first word of each index command.
+    self._completer_first_tokens = ()
+    # Commandline prefix for which there can be no completions.
+    self._completer_miss = None
     self.interactive = False
     self.filter_engine = None
     self.pipe = None
@@ -362,6 +380,9 @@ class TCLI(object):
     self.system_color = ''
     self.title_color = ''
     self.warning_color = ''
+    self._SetColorFormats()
+    # Terminal (rows, columns), cached until the terminal is resized.
+    self._terminal_size = None
 
     self.buffers = text_buffer.TextBuffer()
     self.cmd_response = command_response.CmdResponse()
@@ -405,10 +426,13 @@ class TCLI(object):
     tcli_obj.recordall = self.recordall
     tcli_obj.safemode = self.safemode
     tcli_obj.system_color = self.system_color
+    tcli_obj._system_format = self._system_format
     tcli_obj.timeout = self.timeout
     tcli_obj.title_color = self.title_color
+    tcli_obj._title_format = self._title_format
     tcli_obj.verbose = self.verbose
     tcli_obj.warning_color = self.warning_color
+    tcli_obj._warning_format = self._warning_format
 
     return tcli_obj
 
@@ -441,7 +465,7 @@ class TCLI(object):
       safe = ''
 
     # Truncate prompt if too long to fit in terminal.
-    (_, width) = terminal.TerminalSize()
+    (_, width) = self._TerminalSize()
     if (len(PROMPT_HDR % (
         self.inventory.targets,
         len(self.device_list), safe)) > width):
@@ -450,9 +474,33 @@ class TCLI(object):
       target_str = self.inventory.targets
 
     self.prompt = PROMPT_HDR % (
-        terminal.AnsiText(target_str, self.system_color),
-        terminal.AnsiText(len(self.device_list), self.warning_color),
-        terminal.AnsiText(safe, self.title_color))
+        self._system_format % target_str,
+        self._warning_format % len(self.device_list),
+        self._title_format % safe)
+
+  def _SetColorFormats(self):
+    """Builds format strings that wrap text in the current color escapes.
+
+    The escape sequences only change with the color scheme, so are resolved
+    here rather than on each prompt and printed line.
+    """
+
+    self._system_format = terminal.AnsiText('%s', self.system_color)
+    self._title_format = terminal.AnsiText('%s', self.title_color)
+    self._warning_format = terminal.AnsiText('%s', self.warning_color)
+
+  def _TerminalSize(self):
+    """Returns terminal size, cached to avoid a syscall per prompt."""
+
+    if self._terminal_size is None:
+      self._terminal_size = terminal.TerminalSize()
+    return self._terminal_size
+
+  # pylint: disable=unused-argument
+  def _ResetTerminalSize(self, signum=None, frame=None):
+    """Signal handler that discards the cached size on terminal resize."""
+    self._terminal_size = None
+  # pylint: enable=unused-argument
 
   def _InitInventory(self):
     """Inits inventory and triggers async load of device data."""
@@ -506,7 +554,7 @@ class TCLI(object):
     cli_parser.RegisterCommand(
         'color', TILDE_COMMAND_HELP['color'], inline=True, toggle=True,
         default_value=FLAGS.color, handler=self._CmdToggleValue,
-        completer=lambda: ['on', 'off'])
+        completer=lambda: TOGGLE_VALUES)
     cli_parser.RegisterCommand(
         'color_scheme', TILDE_COMMAND_HELP['color_scheme'],
         inline=True, default_value=FLAGS.color_scheme,
@@ -543,7 +591,7 @@ class TCLI(object):
     cli_parser.RegisterCommand(
         'linewrap', TILDE_COMMAND_HELP['linewrap'],
         inline=True, toggle=True, default_value=FLAGS.linewrap,
-        handler=self._CmdToggleValue, completer=lambda: ['on', 'off'])
+        handler=self._CmdToggleValue, completer=lambda: TOGGLE_VALUES)
     cli_parser.RegisterCommand(
         'log', TILDE_COMMAND_HELP['log'], append=True, inline=True,
         handler=self._CmdLogging)
@@ -577,7 +625,7 @@ class TCLI(object):
     cli_parser.RegisterCommand(
         'safemode', TILDE_COMMAND_HELP['safemode'], short_name='S', inline=True,
         toggle=True, handler=self._CmdToggleValue,
-        completer=lambda: ['on', 'off'])
+        completer=lambda: TOGGLE_VALUES)
     cli_parser.RegisterCommand(
         'timeout', TILDE_COMMAND_HELP['timeout'],
         default_value=FLAGS.timeout, handler=self._CmdTimeout)
@@ -586,7 +634,7 @@ class TCLI(object):
         max_args=2, handler=self._CmdWrite)
     cli_parser.RegisterCommand(
         'verbose', TILDE_COMMAND_HELP['verbose'], inline=True, toggle=True,
-        handler=self._CmdToggleValue, completer=lambda: ['on', 'off'])
+        handler=self._CmdToggleValue, completer=lambda: TOGGLE_VALUES)
     cli_parser.RegisterCommand(
         'vi', TILDE_COMMAND_HELP['vi'], min_args=1, handler=self._CmdEditor)
 
@@ -623,6 +671,9 @@ class TCLI(object):
     if self.interactive:
       # Set safe mode.
       self.cli_parser.ExecHandler('safemode', ['on'], False)
+      # Refresh the cached terminal size when the window changes size.
+      if hasattr(signal, 'SIGWINCH'):
+        signal.signal(signal.SIGWINCH, self._ResetTerminalSize)
       # Apply user settings.
       self._ParseRCFile()
       # Reapply flag values that may have changed by RC commands.
@@ -647,6 +698,8 @@ class TCLI(object):
   def Completer(self, word, state):
     """Command line completion used by readline library."""
 
+    # Only called by readline, which is not imported in batch mode.
+    import readline  # pylint: disable=g-import-not-at-top
     # Silently discard leading whitespace on cli.
     full_line = readline.get_line_buffer().lstrip()
     if full_line and full_line.startswith(TILDE):
@@ -656,96 +709,189 @@ class TCLI(object):
   def _TildeCompleter(self, full_line, state):
     """Command line completion for escape commands."""
 
-    # Pass subsequent arguments of a command to its completer.
-    if ' ' in full_line:
-      cmd = full_line[1:full_line.index(' ')]
-      arg_string = full_line[full_line.index(' ') +1:]
-      completer_list = []
-      if self.cli_parser.GetCommand(cmd):
-        for arg_options in self.cli_parser.GetCommand(cmd).completer():
-          if arg_options.startswith(arg_string):
-            completer_list.append(arg_options)
-
-      if state < len(completer_list):
-        return completer_list[state]
-      return None
+    # First invocation, so build candidate list and cache for re-use.
+    if state == 0:
+      self._completer_list = []
+      # Pass subsequent arguments of a command to its completer.
+      if ' ' in full_line:
+        # Short names are expanded to the full command name.
+        cmd = self.cli_parser.GetCommandName(full_line[1:full_line.index(' ')])
+        arg_string = full_line[full_line.index(' ') +1:]
+        if cmd:
+          # Commands without argument completion have a completer of None.
+          for arg_options in self.cli_parser.GetCommand(cmd).completer() or ():
+            if arg_options.startswith(arg_string):
+              self._completer_list.append(arg_options)
+      else:
+        # First word, a TCLI command word.
+        # Strip TILDE and find the commands that start with the remainder.
+        cmd_prefix = full_line[1:]
+        cmd_names = self.cli_parser.GetCommandNames()
+        for index in range(bisect.bisect_left(cmd_names, cmd_prefix),
+                           len(cmd_names)):
+          cmd = cmd_names[index]
+          if not cmd.startswith(cmd_prefix):
+            break
+          # Re-apply TILDE to completion.
+          self._completer_list.append(TILDE + cmd)
+          # APPEND sorts ahead of the characters in command names so the
+          # completer list remains sorted.
+          if self.cli_parser.GetCommand(cmd).append:
+            self._completer_list.append(TILDE + cmd + command_parser.APPEND)
 
-    # First word, a TCLI command word.
-    completer_list = []
-    for cmd in self.cli_parser:
-      # Strip TILDE and compare.
-      if cmd.startswith(full_line[1:]):
-        completer_list.append(cmd)
-        if self.cli_parser.GetCommand(cmd).append:
-          completer_list.append(cmd + command_parser.APPEND)
-    completer_list.sort()
-
-    if state < len(completer_list):
-      # Re-apply TILDE to completion.
-      return TILDE + completer_list[state]
-    return None
+    try:
+      return self._completer_list[state]
+    except IndexError:
+      return None
 
   def _CmdCompleter(self, full_line, state):
     """Commandline completion used by readline library."""
 
     # First invocation, so build candidate list and cache for re-use.
     if state == 0:
-      self._completer_list = []
-      current_word = ''
-      line_tokens = []
-      word_boundary = False
-      self._completer_list = []
-      # What has been typed so far.
-
-      # Collapse quotes to remove any whitespace within.
-      cleaned_line = re.sub(r'\".+\"', '""', full_line)
-      cleaned_line = re.sub(r'\'.+\'', '""', cleaned_line)
-      # Remove double spaces etc
-      cleaned_line = re.sub(r'\s+', ' ', cleaned_line)
-
-      # Are we part way through typing a word or not.
-      if cleaned_line and cleaned_line.endswith(' '):
-        word_boundary = True
-
-      cleaned_line = cleaned_line.rstrip()
-      # If blank line then this is also a word boundary.
-      if not cleaned_line:
-        word_boundary = True
+      trie = self._CompleterTrie()
+      # Extending a line that matched no index commands cannot match either.
+      if (self._completer_miss is not None and
+          full_line.startswith(self._completer_miss)):
+        self._completer_list = ()
+        return None
+
+      # A blank line completes to the first word of every command.
+      if not full_line:
+        self._completer_list = self._completer_first_tokens
       else:
-        # Split into word tokens.
-        line_tokens = cleaned_line.split(' ')
+        current_word = ''
+        # What has been typed so far.
+        (line_tokens, word_boundary) = self._CompleterLineTokens(full_line)
         # If partially through typing a word then don't include it as a token.
-        if not word_boundary and line_tokens:
+        if not word_boundary:
           current_word = line_tokens.pop()
 
-      # Compare with table of possible commands
-      for row in self.filter_engine.index.index:
-        # Split the regexp into tokens, re combine only as many as there are
-        # in the line entered so far.
-        cmd_tokens = row['Command'].split(' ')
-        # Does the line match the partial list of tokens.
-        if (line_tokens and
-            re.match(' '.join(cmd_tokens[:len(line_tokens)]), cleaned_line)):
-          # Take token not from end of regexp, but from the Completer command.
-          token = cmd_tokens[len(line_tokens)]
-        elif not line_tokens:
-          # Currently a blank line so the first token is what we want.
-          token = cmd_tokens[0]
-        else:
-          continue
-        # We have found a match.
-        # Remove completer syntax.
-        token = re.sub(r'\(|\)\?', '', token)
-        # If on word boundary or our current word is a partial match.
-        if word_boundary or token.startswith(current_word):
-          if token not in self._completer_list:
-            self._completer_list.append(token)
+        # Walk the trie of index commands, one level per token entered so far.
+        nodes = [trie]
+        for depth, line_token in enumerate(line_tokens):
+          matched_nodes = []
+          for node in nodes:
+            for (cmd_re, _, child) in node.values():
+              # Prior tokens match in their entirety, the last only as a prefix.
+              if depth < len(line_tokens) -1:
+                matched = cmd_re.fullmatch(line_token)
+              else:
+                matched = cmd_re.match(line_token)
+              if matched:
+                matched_nodes.append(child)
+          nodes = matched_nodes
+
+        # Complete tokens are fixed as the line is extended, so if they matched
+        # nothing then nor will any longer line. Closing a quote can re-tokenise
+        # the line, so lines with quotes are not recorded.
+        if (not any(nodes) and
+            '"' not in full_line and "'" not in full_line):
+          self._completer_miss = full_line
+
+        # Candidate tokens are the children of the matching nodes.
+        # Dictionary keys remove duplicates while retaining the index order.
+        candidates = {}
+        for node in nodes:
+          for (_, token, _) in node.values():
+            # If on word boundary or our current word is a partial match.
+            if word_boundary or token.startswith(current_word):
+              candidates[token] = None
+        self._completer_list = tuple(candidates)
 
     try:
       return self._completer_list[state]
     except IndexError:
       return None
 
+  def _CompleterLineTokens(self, full_line):
+    """Splits commandline into word tokens for command completion.
+
+    Quoted text is collapsed to '""' so that whitespace within it is not
+    treated as a word boundary. Unterminated quotes are treated as text.
+
+    Args:
+      full_line: str, what has been typed so far.
+
+    Returns:
+      Tuple, list of word tokens and a bool for if the line ends on a word
+      boundary i.e. we are not part way through typing a word.
+    """
+
+    # Are we part way through typing a word or not.
+    # A blank line is also a word boundary.
+    word_boundary = not full_line or full_line[-1].isspace()
+    if '"' not in full_line and "'" not in full_line:
+      tokens = full_line.split()
+      return (tokens, word_boundary or not tokens)
+
+    tokens = []
+    token = ''
+    index = 0
+    while index < len(full_line):
+      char = full_line[index]
+      if char.isspace():
+        if token:
+          tokens.append(token)
+          token = ''
+      elif char in '"\'':
+        close_index = full_line.find(char, index + 1)
+        if close_index == -1:
+          token += char
+        else:
+          # Skip to the closing quote.
+          token += '""'
+          index = close_index
+      else:
+        token += char
+      index += 1
+    if token:
+      tokens.append(token)
+    return (tokens, word_boundary or not tokens)
+
+  def _CompleterTrie(self):
+    """Returns a token trie of the filter index commands.
+
+    Each node is a dictionary keyed on the command regexp token, with values of
+    the compiled regexp, the token with completer syntax removed and the child
+    node. The trie is rebuilt only when the filter engine changes.
+
+    Returns:
+      Dictionary, the root node of the trie.
+    """
+
+    if self._completer_trie_engine is not self.filter_engine:
+      self._completer_trie = {}
+      for row in self.filter_engine.index.index:
+        node = self._completer_trie
+        cmd_tokens = row['Command'].split(' ')
+        for (index, cmd_token) in enumerate(cmd_tokens):
+          if cmd_token not in node:
+            try:
+              cmd_re = re.compile(cmd_token)
+            except re.error:
+              # A group that spans a space, e.g. 'mac(-| )address', cannot be
+              # split into tokens. The rest of the row becomes a single leaf.
+              remainder = ' '.join(cmd_tokens[index:])
+              try:
+                cmd_re = re.compile(remainder)
+              except re.error:
+                logging.debug('Invalid index command "%s".', row['Command'])
+                break
+              node.setdefault(
+                  remainder,
+                  (cmd_re, COMPLETER_SYNTAX_RE.sub('', cmd_token), {}))
+              break
+            # Remove completer syntax.
+            node[cmd_token] = (cmd_re,
+                               COMPLETER_SYNTAX_RE.sub('', cmd_token), {})
+          node = node[cmd_token][2]
+      self._completer_first_tokens = tuple(
+          {token: None for (_, token, _) in self._completer_trie.values()})
+      self._completer_trie_engine = self.filter_engine
+      self._completer_miss = None
+    return self._completer_trie
+
   def ParseCommands(self, commands):
     """Parses commands and executes them.
 
@@ -946,20 +1092,20 @@ class TCLI(object):
       instance with the tilde commands applied (None if no tilde commands).
     """.replace('%s', (TILDE * 2))
 
-    if '%s' % (TILDE * 2) not in command:
+    # Inline commands must be preceded by a space.
+    if INLINE_SEPARATOR not in command:
       return (command, None)
 
     # Create new child with inline escape command changes.
     inline_tcli = copy.copy(self)
 
-    token_list = command.split(' %s' % (TILDE * 2))
-    # If all tokens parse then the first token is the commandline.
-    command_left = token_list[0]
-    command_right = token_list[1:]
-    # Reverse the order of the tokens so that we work right to left.
-    command_right.reverse()
-    index = len(command_right)
-    for token in command_right:
+    # Work right to left, peeling off one inline command at a time.
+    # If all tokens parse then what remains is the commandline.
+    command_left = command
+    while True:
+      (head, separator, token) = command_left.rpartition(INLINE_SEPARATOR)
+      if not separator:
+        break
       # Confirm that is parses and executes cleanly.
       try:
         (new_cmd, args, append) = inline_tcli.cli_parser.ParseCommandLine(token)
@@ -967,14 +1113,13 @@ class TCLI(object):
       except (ValueError, ParseError):
         # If a token doesn't parse then it and all tokens to the left are
         # returned to the commandline.
-        command_left = (' %s' % (TILDE * 2)).join(token_list[:index + 1])
         break
       except EOFError:
         # Exit in this context stop further inline command parsing.
         # Inline commands to the left of the exit are treated as regular input.
-        command_left = (' %s' % (TILDE * 2)).join(token_list[:index])
+        command_left = head
         break
-      index -= 1
+      command_left = head
 
     return (command_left, inline_tcli)
 
@@ -997,43 +1142,27 @@ class TCLI(object):
     if '||' not in command:
       return (command, '')
 
-    found_single_pipe = False
-    dbl_pipe_str = ''
-    cmd_str = ''
-    # Split out quoted and non-quoted text and work through from the right.
-    for cmd_elem in reversed(
-        re.findall("""([^"']+)|("[^"]*")|('[^']*')""", command)):
-      (nonquoted, _, _) = cmd_elem
-      if nonquoted and not found_single_pipe:
-        # At this point we have non-quoted text that may have '|' or '||' in it.
-        # Convert something like:
-        #   '0 || 1 | 2 || 3 |||'
-        # Into:
-        #   ('0 || 1 | 2', '| 3 |||')
-
-        tmp_str = ''
-        # Split out pipe commands and work through from right.
-        for pipe_elem in reversed(re.findall(r'([^|]+)|(\|+)', nonquoted)):
-          (pipe_text, pipe_cmd) = pipe_elem
-          if not pipe_cmd:
-            tmp_str = pipe_text + tmp_str
-            continue
-
-          if pipe_cmd == '||' and not found_single_pipe:
-            dbl_pipe_str = '|' + tmp_str + cmd_str + dbl_pipe_str
-            cmd_str = ''
-            tmp_str = ''
-          else:
-            if pipe_cmd == '|':
-              # No more double pipe elements.
-              found_single_pipe = True
-            tmp_str = pipe_cmd + tmp_str
-
-        cmd_str = tmp_str + cmd_str
-      else:
-        cmd_str = ''.join(cmd_elem) + cmd_str
-
-    return (cmd_str.rstrip(), dbl_pipe_str.strip())
+    # Split the command into quoted text, non-quoted text and runs of pipes.
+    # Double pipes to the right of the last single pipe are local pipes.
+    # Quote characters without a closing quote are discarded.
+    cmd_elems = []
+    dbl_pipes = []
+    for match in COMMAND_ELEMENT_RE.finditer(command):
+      if match.lastgroup == 'pipes':
+        if len(match.group()) == 1:
+          # Double pipes to the left of a single pipe are not local pipes.
+          dbl_pipes = []
+        elif len(match.group()) == 2:
+          dbl_pipes.append(len(cmd_elems))
+      cmd_elems.append(match.group())
+
+    if not dbl_pipes:
+      return (''.join(cmd_elems).rstrip(), '')
+
+    for pipe_index in dbl_pipes:
+      cmd_elems[pipe_index] = '|'
+    return (''.join(cmd_elems[:dbl_pipes[0]]).rstrip(),
+            ''.join(cmd_elems[dbl_pipes[0]:]).strip())
 
   def _FormatRaw(self, response, pipe=''):
     """Display response in raw format."""
@@ -1149,7 +1278,7 @@ class TCLI(object):
       self._PrintOutput(self._Pipe(result.LabelValueTable(), pipe=pipe))
 
     elif self.display == 'tbl':
-      (_, width) = terminal.TerminalSize()
+      (_, width) = self._TerminalSize()
       try:
         self._PrintOutput(self._Pipe(result.FormattedTable(width), pipe=pipe))
       except TableError as error_message:
@@ -1284,6 +1413,7 @@ class TCLI(object):
       else:
         raise ValueError('Error: Unknown color scheme: %s' % scheme)
       self.color_scheme = scheme
+    self._SetColorFormats()
 
   def _CmdCommand(self, command, args, append):
     """Submit command to devices."""
@@ -1396,7 +1526,7 @@ class TCLI(object):
 
     result = []
     # Print the brief comment regarding escape commands.
-    for cmd in sorted(self.cli_parser):
+    for cmd in self.cli_parser.GetCommandNames():
       append = ''
       if self.cli_parser.GetCommand(cmd).append:
         append = '[+]'
@@ -1575,6 +1705,16 @@ class TCLI(object):
   # End of command handles.                                                    #
   ##############################################################################
 
+  def _LineWrap(self, msg):
+    """Wraps lines that are wider than the terminal."""
+
+    msg = str(msg)
+    # A short single line, as most messages are, is returned as is. Line breaks
+    # and other unprintable characters are left to LineWrap.
+    if msg.isprintable() and len(msg) <= self._TerminalSize()[1]:
+      return msg
+    return terminal.LineWrap(msg)
+
   def _PrintWarning(self, msg):
     """Prints warnings to stderr."""
 
@@ -1585,10 +1725,10 @@ class TCLI(object):
       self.buffers.Append(buf, msg)
 
     if self.linewrap:
-      msg = terminal.LineWrap(msg)
+      msg = self._LineWrap(msg)
 
     if self.color:
-      print(terminal.AnsiText(msg, self.warning_color), file=sys.stderr)
+      print(self._warning_format % msg, file=sys.stderr)
     else:
       print(msg, file=sys.stderr)
 
@@ -1602,10 +1742,10 @@ class TCLI(object):
       self.buffers.Append(buf, msg)
 
     if self.linewrap:
-      msg = terminal.LineWrap(msg)
+      msg = self._LineWrap(msg)
 
     if title and self.color:
-      print(terminal.AnsiText(msg, self.title_color))
+      print(self._title_format % msg)
     else:
       print(msg)
 
@@ -1619,10 +1759,10 @@ class TCLI(object):
       self.buffers.Append(buf, msg)
 
     if self.linewrap:
-      msg = terminal.LineWrap(msg)
+      msg = self._LineWrap(msg)
 
     if self.color:
-      print(terminal.AnsiText(msg, self.system_color))
+      print(self._system_format % msg)
     else:
       print(msg)
 
@@ -238,6 +238,20 @@ class UnitTestTCLI(unittest.TestCase):
           self.assertFalse(self.tcli_obj.interactive)
           mock_parse.assert_called_once_with()
 
+  def testCmdCompleterSpacedGroup(self):
+    """Tests index commands with a group spanning a space still complete."""
+
+    self.tcli_obj.filter_engine = clitable.CliTable(
+        'spaced_index', template_dir=tcli.FLAGS.template_dir)
+
+    self.assertEqual('cat', self.tcli_obj._CmdCompleter('', 0))
+    self.assertEqual('show', self.tcli_obj._CmdCompleter('', 1))
+    self.assertEqual('cat', self.tcli_obj._CmdCompleter('c', 0))
+    self.assertEqual('alpha', self.tcli_obj._CmdCompleter('c ', 0))
+    # The remainder of the row is offered as a single token.
+    self.assertEqual('mac-|', self.tcli_obj._CmdCompleter('sh ', 0))
+    self.assertEqual(None, self.tcli_obj._CmdCompleter('sh ', 1))
+
   def testTildeCompleter(self):
 
     self.assertEqual(
@@ -253,6 +267,24 @@ class UnitTestTCLI(unittest.TestCase):
         '/recordstop', self.tcli_obj._TildeCompleter('/reco', 4))
     self.assertEqual(
         None, self.tcli_obj._TildeCompleter('/reco', 5))
+    # Subsequent states are served from the list built for state zero.
+    # The parser is replaced whole, as a compiled parser cannot be patched.
+    with mock.patch.object(self.tcli_obj, 'cli_parser') as mock_parser:
+      self.assertEqual(
+          '/recordall', self.tcli_obj._TildeCompleter('/reco', 2))
+      mock_parser.GetCommandNames.assert_not_called()
+    # Arguments are completed for both long and short command names.
+    self.assertEqual(
+        'csv', self.tcli_obj._TildeCompleter('/display c', 0))
+    self.assertEqual(
+        'csv', self.tcli_obj._TildeCompleter('/D c', 0))
+    self.assertEqual(
+        None, self.tcli_obj._TildeCompleter('/D c', 1))
+    # Commands without a completer have no argument completions.
+    self.assertEqual(
+        None, self.tcli_obj._TildeCompleter('/command sh', 0))
+    self.assertEqual(
+        None, self.tcli_obj._TildeCompleter('/C sh', 0))
 
   def testCmdCompleter(self):
     self.tcli_obj = tcli.TCLI()
@@ -267,6 +299,11 @@ class UnitTestTCLI(unittest.TestCase):
     self.assertEqual('show', self.tcli_obj._CmdCompleter('', 0))
     self.assertEqual('cat', self.tcli_obj._CmdCompleter('', 1))
     self.assertEqual(None, self.tcli_obj._CmdCompleter('', 2))
+    # Blank line completions are computed when the trie is built.
+    with mock.patch.object(
+        self.tcli_obj, '_CompleterLineTokens') as mock_tokens:
+      self.assertEqual('show', self.tcli_obj._CmdCompleter('', 0))
+      self.assertFalse(mock_tokens.called)
 
     self.assertEqual('cat', self.tcli_obj._CmdCompleter('c', 0))
     self.assertEqual(None, self.tcli_obj._CmdCompleter('c', 1))
@@ -279,6 +316,46 @@ class UnitTestTCLI(unittest.TestCase):
     self.assertEqual(
         'alpha', self.tcli_obj._CmdCompleter('c al', 0))
     self.assertEqual(None, self.tcli_obj._CmdCompleter('c al', 1))
+    # No completions beyond the end of the command.
+    self.assertEqual(None, self.tcli_obj._CmdCompleter('cat alpha ', 0))
+    # Lines extending one without completions are not tokenised again.
+    with mock.patch.object(
+        self.tcli_obj, '_CompleterLineTokens') as mock_tokens:
+      self.assertEqual(None, self.tcli_obj._CmdCompleter('cat alpha b', 0))
+      self.assertFalse(mock_tokens.called)
+    # Only the most recent line without completions is remembered.
+    self.assertEqual(None, self.tcli_obj._CmdCompleter('dog ', 0))
+    with mock.patch.object(
+        self.tcli_obj, '_CompleterLineTokens') as mock_tokens:
+      self.assertEqual(None, self.tcli_obj._CmdCompleter('dog al', 0))
+      self.assertFalse(mock_tokens.called)
+    # A partial word without completions may still complete once finished.
+    self.assertEqual(None, self.tcli_obj._CmdCompleter('cat alphax', 0))
+    self.assertEqual('alpha', self.tcli_obj._CmdCompleter('cat al', 0))
+
+    # Trie is built once and only rebuilt when the filter engine changes.
+    trie = self.tcli_obj._CompleterTrie()
+    self.assertIs(trie, self.tcli_obj._CompleterTrie())
+    self.tcli_obj.filter_engine = clitable.CliTable(
+        'default_index', template_dir=tcli.FLAGS.template_dir)
+    self.assertIsNot(trie, self.tcli_obj._CompleterTrie())
+
+  def testCompleterLineTokens(self):
+    """Tests splitting of the commandline for completion."""
+
+    self.assertEqual(([], True), self.tcli_obj._CompleterLineTokens(''))
+    self.assertEqual(([], True), self.tcli_obj._CompleterLineTokens('  '))
+    self.assertEqual((['c', 'al'], False),
+                     self.tcli_obj._CompleterLineTokens('c  al'))
+    self.assertEqual((['c', 'al'], True),
+                     self.tcli_obj._CompleterLineTokens('c al '))
+    # Quoted text is collapsed, unterminated quotes are left as is.
+    self.assertEqual((['c', '""', 'al'], False),
+                     self.tcli_obj._CompleterLineTokens('c "a b" al'))
+    self.assertEqual((['c', '""'], True),
+                     self.tcli_obj._CompleterLineTokens("c 'a b' "))
+    self.assertEqual((['c', '"a', 'b'], False),
+                     self.tcli_obj._CompleterLineTokens('c "a b'))
 
   def testCallback(self):
     """Tests async callback."""
@@ -564,6 +641,30 @@ class UnitTestTCLI(unittest.TestCase):
       self.tcli_obj._FormatResponse(['beef'])
       mock_warn.called_once_with('Width too narrow to display table.')
 
+  def testTerminalSize(self):
+    """Tests terminal size is cached until reset."""
+
+    tcli.terminal.TerminalSize = mock.Mock(return_value=(24, 10))
+    self.assertEqual((24, 10), self.tcli_obj._TerminalSize())
+    self.assertEqual((24, 10), self.tcli_obj._TerminalSize())
+    self.assertEqual(1, tcli.terminal.TerminalSize.call_count)
+    # Resizing the terminal discards the cached size.
+    self.tcli_obj._ResetTerminalSize()
+    tcli.terminal.TerminalSize.return_value = (24, 20)
+    self.assertEqual((24, 20), self.tcli_obj._TerminalSize())
+
+  def testLineWrapShort(self):
+    """Tests only long or multiline messages are passed to LineWrap."""
+
+    with mock.patch.object(tcli.terminal, 'LineWrap') as mock_wrap:
+      self.assertEqual('a' * 20, self.tcli_obj._LineWrap('a' * 20))
+      self.assertFalse(mock_wrap.called)
+      self.tcli_obj._LineWrap('a' * 21)
+      mock_wrap.assert_called_once_with('a' * 21)
+      mock_wrap.reset_mock()
+      self.tcli_obj._LineWrap('a\nb')
+      mock_wrap.assert_called_once_with('a\nb')
+
   def testColor(self):
     self.tcli_obj.color = False
     self.tcli_obj.TildeCmd('color on')
@@ -590,6 +691,10 @@ class UnitTestTCLI(unittest.TestCase):
     self.assertEqual(tcli.DARK_SYSTEM_COLOR, self.tcli_obj.system_color)
     self.assertEqual(tcli.DARK_WARNING_COLOR, self.tcli_obj.warning_color)
     self.assertEqual(tcli.DARK_TITLE_COLOR, self.tcli_obj.title_color)
+    # Escapes for the scheme are resolved once.
+    self.assertEqual(
+        tcli.terminal.AnsiText('boo', tcli.DARK_SYSTEM_COLOR),
+        self.tcli_obj._system_format % 'boo')
 
     self.tcli_obj._CmdColorScheme('color_scheme', ['light'])
     self.assertEqual(tcli.LIGHT_SYSTEM_COLOR, self.tcli_obj.system_color)
@@ -685,6 +790,12 @@ class UnitTestTCLI(unittest.TestCase):
         ("cat alpha | grep '||'", ''),
         self.tcli_obj._ExtractPipe(cmd))
 
+    # Runs of more than two pipes are not local pipes.
+    cmd = 'cat alpha || grep xyz ||| grep -v .'
+    self.assertEqual(
+        ('cat alpha', '| grep xyz ||| grep -v .'),
+        self.tcli_obj._ExtractPipe(cmd))
+
   def testParseCommands(self):
     """Tests that commands destined for are supplied to CmdRequests."""
 